@@ -1,16 +1,10 @@
-import chip64_util as c16u
 import chip16_device as c16d
 import chip16_except as c16e
-import numpy as np
-import itertools as itt
-import warnings
+from array import array
+import functools
+import platform
 import random
 
-# Writing code to emulate low level hardware often requires using things like
-# well modelled integer overflow. Numpy warns when this happens and thereby
-# clogs the console with warnings about expected behaviour. This imperative
-# prevents this.
-warnings.filterwarnings("ignore")
 
 deviceList = [
     c16d.ConsoleIO()
@@ -18,6 +12,62 @@ deviceList = [
 
 defaultDevices = deviceList + [None]*(16 - len(deviceList))
 
+# Maximum depth of nested subroutine calls.
+STACK_SIZE = 64
+
+# A loop over ALU, skip, smp, ldr and goto instructions, used to warm up
+# PyPy's JIT. See pypy_warmup.
+WARMUP_CODE = [
+    0x71, 0x01,  # adc R1, 1
+    0x82, 0x14,  # add R2, R1
+    0x83, 0x15,  # sub R3, R1
+    0x84, 0x26,  # shr R4, 2
+    0x85, 0x2E,  # shl R5, 2
+    0x31, 0x01,  # snec R1, 1
+    0x91, 0x20,  # snue R1, R2
+    0xA0, 0x00,  # smp 0
+    0xE6, 0x65,  # ldr R6
+    0x10, 0x00,  # goto 0
+]
+
+# Maximum number of instructions compiled into one block by execute().
+BLOCK_LIMIT = 64
+
+# Python source for the 8XYN instructions, used when compiling blocks. Shifts
+# by zero only clear the carry and are handled separately.
+ALU_SOURCE = {
+    0x0: "R[{x}] = R[{y}]",
+    0x1: "R[{x}] |= R[{y}]",
+    0x2: "R[{x}] &= R[{y}]",
+    0x3: "R[{x}] ^= R[{y}]",
+    0x4: "t = R[{x}] + R[{y}]; R[15] = t >> 16; R[{x}] = t & 0xFFFF",
+    0x5: "t = R[{x}] - R[{y}]; R[15] = 1 if t >= 0 else 0; R[{x}] = t & 0xFFFF",
+    0x6: "R[15] = (R[{x}] >> ({y} - 1)) & 1; R[{x}] >>= {y}",
+    0x7: "t = R[{y}] - R[{x}]; R[15] = 1 if t >= 0 else 0; R[{x}] = t & 0xFFFF",
+    0xE: "R[15] = (R[{x}] >> (16 - {y})) & 1; R[{x}] = (R[{x}] << {y}) & 0xFFFF",
+}
+
+# Python conditions for the skip instructions, keyed by the top nibble.
+SKIP_SOURCE = {
+    0x3: "R[{x}] == {nn}",
+    0x4: "R[{x}] != {nn}",
+    0x5: "R[{x}] == R[{y}]",
+    0x9: "R[{x}] != R[{y}]",
+}
+
+# Number of random bytes drawn at a time for the bar instruction.
+RAND_BATCH = 4096
+
+
+def random_bytes(draw):
+    """
+    Yields random bytes forever as ints, taking them RAND_BATCH at a time from
+    draw(RAND_BATCH) so that each bar instruction only costs a next() call.
+    """
+    while True:
+        yield from draw(RAND_BATCH)
+
+
 def real_time(cycles, hertz=10**6):
     return cycles/hertz
 
@@ -26,80 +76,116 @@ class Chip16:
     The main class for the chip16 emulator.
     """
 
-    def __init__(self, code=[], devices=defaultDevices):
+    def __init__(self, code=[], devices=defaultDevices, backend="numpy", seed=None):
         """
         Class constructor which initialises object state and handles relevant errors.
-        """
-        self.ram = [np.uint8(0)] * 4096
-        self.R = [np.uint16(0)] * 16
-        self.stack = []
-        self.code_ptr = np.uint16(0)
-        self.I = np.uint16(0)
+        backend selects the storage for RAM and registers: "numpy" uses
+        ndarrays, "pypy" uses a bytearray and unsigned short arrays so that
+        PyPy's JIT can trace the emulator without calling into numpy.
+        seed seeds the random numbers used by bar.
+        """
+        if backend == "numpy":
+            # numpy is only needed by this backend, so the pypy backend runs
+            # without it installed.
+            import numpy as np
+            # Registers, stack and RAM are views into one contiguous buffer,
+            # laid out in that order, so the whole machine state is a single
+            # small block of memory.
+            stack_end = 2 * (16 + STACK_SIZE)
+            self._state = np.zeros(stack_end + 4096, dtype=np.uint8)
+            self.R = self._state[:32].view(np.uint16)
+            self.stack = self._state[32:stack_end].view(np.uint16)
+            self.ram = self._state[stack_end:]
+        elif backend == "pypy":
+            self.ram = bytearray(4096)
+            self.R = array("H", bytes(2 * 16))
+            self.stack = array("H", bytes(2 * STACK_SIZE))
+        else:
+            raise ValueError("Unknown backend: {}".format(backend))
+        self.backend = backend
+        self.sp = 0
+        self.code_ptr = 0
+        self.I = 0
         self.alert = False
-        if len(code) > len(self.memory):
-            raise SizeError()
-        for i, byte in enumerate(code):
-            self.memory[i] = byte
+        if len(code) > len(self.ram):
+            raise c16e.SizeError()
+        self._ram_mv = memoryview(self.ram)
+        self._ram_mv[:len(code)] = bytes(code)
         self.devices = devices + [None]*(16 - len(devices))
         self.cycles = 0
+        self.seed = seed
+        if backend == "numpy":
+            self._rng = np.random.default_rng(seed)
+            self._rand = random_bytes(self._rng.bytes)
+        else:
+            self._rng = random.Random(seed)
+            self._rand = random_bytes(self._rng.randbytes)
+        # Compiled blocks keyed by start address, a per byte flag marking RAM
+        # that lies inside a compiled block, and a copy of RAM as it was when
+        # execute() last returned.
+        self._blocks = {}
+        self._covered = bytearray(len(self.ram))
+        self._ram_image = b""
     
 
     def reset(self):
         """
         A small helper class that resets the Chip16 object, typically called in tests.
         """
-        self.__init__()
+        self.__init__(backend=self.backend, seed=self.seed)
     
     
     def ret(self):
         """
         Implements the ret instruction.
-        Returns from subroutine.
+        Returns from subroutine, resuming after the call instruction.
         """
-        self.code_ptr = self.stack.pop()
+        if self.sp == 0:
+            raise c16e.StackUnderflow()
+        self.sp -= 1
+        self.code_ptr = int(self.stack[self.sp]) + 2
         self.cycles += 2
 
     
-    def goto(self, address : np.uint16) -> None:
+    def goto(self, address : int) -> None:
         """
         Implements the goto instruction.
         Sets the code pointer to a memory pointer.
         """
-        assert 0 <= address < 4096
-        self.code_ptr = address
+        self.code_ptr = address & 0xFFF
         self.cycles += 1
 
     
-    def call(self, address : np.uint16) -> None:
+    def call(self, address : int) -> None:
         """
         Implements the call instruction.
         Pushes the code pointer to the call stack and sets the code pointer to 
         the address of the subroutine given.
         """
-        assert 0 <= address < 4096
-        self.stack.append(self.code_ptr)
-        self.code_ptr = address
+        if self.sp >= STACK_SIZE:
+            raise c16e.StackOverflow()
+        self.stack[self.sp] = self.code_ptr
+        self.sp += 1
+        self.code_ptr = address & 0xFFF
         self.cycles += 3
     
     
-    def snec(self, index : int, const : np.uint8) -> None:
+    def snec(self, index : int, const : int) -> None:
         """
         Implements the snec instruction.
         Skips the next instruction if R[index] == const.
         """
-        assert 0 <= index < 16
-        if self.R[index] == constant:
+        if self.R[index] == const:
             self.code_ptr += 2
         self.cycles += 2
     
 
-    def snuec(self, index : int, const : np.uint8) -> None:
+    def snuec(self, index : int, const : int) -> None:
         """
         Implements the snuec instruction.
         Skips the next instruction if R[index] != const.
         """
-        assert 0 <= index < 16
-        if self.R[index] != constant:
+        if self.R[index] != const:
             self.code_ptr += 2
         self.cycles += 2
     
@@ -109,38 +195,43 @@ class Chip16:
         Implements the sne instruction.
         Skips the next instruction if R[dest] == R[src].
         """
-        assert 0 <= dest < 16 and 0 <= src < 16
         if self.R[dest] == self.R[src]:
             self.code_ptr += 2
         self.cycles += 2
     
 
-    def acr(self, dest : int, const : np.uint8) -> None:
+    def acr(self, dest : int, const : int) -> None:
         """
         Implements the acr instruction.
         Sets R[dest] = const.
         """
-        assert 0 <= dest < 16
-        self.R[dest] = np.uint16(const)
+        self.R[dest] = const
         self.cycles += 1
     
 
-    def adc(self, dest : int, const : np.uint8) -> None:
+    def adc(self, dest : int, const : int) -> None:
         """
         Implements the adc instruction.
         Sets R[dest] += const without setting a carry flag.
         """
-        assert 0 <= dest < 16
-        self.R[dest] += np.uint16(const)
+        self.R[dest] = (int(self.R[dest]) + const) & 0xFFFF
         self.cycles += 1
     
 
+    def ar(self, dest : int, src : int) -> None:
+        """
+        Implements the ar instruction.
+        Sets R[dest] = R[src].
+        """
+        self.R[dest] = self.R[src]
+        self.cycles += 1
+
+
     def bit_or(self, dest : int, src : int) -> None:
         """
         Implements the or instruction.
         Sets R[dest] |= R[src].
         """
-        assert 0 <= dest < 16 and 0 <= src < 16
         self.R[dest] |= self.R[src]
         self.cycles += 1
     
@@ -150,7 +241,6 @@ class Chip16:
         Implements the and instruction.
         Sets R[dest] &= R[src].
         """
-        assert 0 <= dest < 16 and 0 <= src < 16
         self.R[dest] &= self.R[src]
         self.cycles += 1
     
@@ -160,7 +250,6 @@ class Chip16:
         Implements the xor instruction.
         Sets R[dest] ^= R[src].
         """
-        assert 0 <= dest < 16 and 0 <= src < 16
         self.R[dest] ^= self.R[src]
         self.cycles += 1
     
@@ -170,10 +259,10 @@ class Chip16:
         Implements the add instruction.
         Sets R[dest] += R[src] setting carry flag if carry generated.
         """
-        assert 0 <= dest < 16 and 0 <= src < 16
-        tmp = self.R[dest] + self.R[src]
-        self.R[0xF] = np.uint16(tmp < self.R[dest])
-        self.R[dest] = np.uint16(tmp)
+        R = self.R
+        tmp = int(R[dest]) + int(R[src])
+        R[0xF] = tmp >> 16
+        R[dest] = tmp & 0xFFFF
         self.cycles += 1
     
 
@@ -182,25 +271,26 @@ class Chip16:
         Implements the sub instruction.
         Sets R[dest] -= R[src] setting the carry flag if no-borrow.
         """
-        assert 0 <= dest < 16 and 0 <= src < 16
-        self.R[0xF] = np.uint16(self.R[dest] >= self.R[src])
-        self.R[dest] -= self.R[src]
+        R = self.R
+        tmp = int(R[dest]) - int(R[src])
+        R[0xF] = 1 if tmp >= 0 else 0
+        R[dest] = tmp & 0xFFFF
         self.cycles += 1
     
 
-    def shr(self, dest : int, srcv : np.uint8) -> None:
+    def shr(self, dest : int, srcv : int) -> None:
         """
         Implements the shr instruction.
         Sets R[dest] >>= srcv setting the carry flag to the value of the
         (srcv+1)'th bit. If srcv == 0 then carry is set to zero.
         """
-        assert 0 <= dest < 16 and 0 <= srcv < 16
+        R = self.R
         if srcv == 0:
-            self.R[0xF] = np.uint16(0)
-            return
-        tmp = self.R[dest] & np.uint16(1 << (srcv - 1))       
-        self.R[0xF] = np.uint16(tmp != 0)
-        self.R[dest] >>= np.uint16(srcv)
+            R[0xF] = 0
+        else:
+            # The carry is written first, so a shift of R[0xF] shifts the carry.
+            R[0xF] = (int(R[dest]) >> (srcv - 1)) & 1
+            R[dest] = int(R[dest]) >> srcv
         self.cycles += 1
     
 
@@ -209,26 +299,27 @@ class Chip16:
         Implememts the rsub instruction.
         Sets R[dest] = R[src] - R[dest] setting the no-borrow flag if needed.
         """
-        assert 0 <= dest < 16 and 0 <= src < 16
-        self.R[0xF] = np.uint16(self.R[src] >= self.R[dest])
-        self.R[dest] = self.R[src] - self.R[dest]
+        R = self.R
+        tmp = int(R[src]) - int(R[dest])
+        R[0xF] = 1 if tmp >= 0 else 0
+        R[dest] = tmp & 0xFFFF
         self.cycles += 1
 
     
 
-    def shl(self, dest : int, srcv : np.uint8) -> None:
+    def shl(self, dest : int, srcv : int) -> None:
         """
         Implements the shl instruction.
         Sets R[dest] <<= R[src] setting the carry flag to the value of the
         (16-srcv)'th bit. If srcv == 0 then carry is set to zero.
         """
-        assert 0 <= dest < 16 and 0 <= srcv < 16
+        R = self.R
         if srcv == 0:
-            self.R[0xF] = np.uint16(0)
-            return
-        tmp = self.R[dest] & np.uint16(1 << (16 - src_value))
-        self.R[0xF] = np.uint16(tmp != 0)
-        self.R[dest] <<= np.uint16(srcv)
+            R[0xF] = 0
+        else:
+            # The carry is written first, so a shift of R[0xF] shifts the carry.
+            R[0xF] = (int(R[dest]) >> (16 - srcv)) & 1
+            R[dest] = (int(R[dest]) << srcv) & 0xFFFF
         self.cycles += 1
     
 
@@ -237,48 +328,44 @@ class Chip16:
         Implements the snue instruction.
         Skips the next instruction if R[dest] != R[src].
         """
-        assert 0 <= dest < 16 and 0 <= src < 16
         if self.R[dest] != self.R[src]:
             self.code_ptr += 2
         self.cycles += 2
 
 
-    def smp(self, address : np.uint16) -> None:
+    def smp(self, address : int) -> None:
         """
         Implements the smp instruction.
-        Sets mem_ptr = value.
+        Sets the memory pointer I = address.
         """
-        assert 0 <= address < 4096
-        self.memory_ptr = value
+        self.I = address
         self.cycles += 1
     
 
-    def cpac(self, const : np.uint8) -> None:
+    def cpac(self, const : int) -> None:
         """
         Implements the cpac instruction.
         Sets code_ptr = R[0] + const
         """
-        self.code_ptr = self.R[0] + np.uint16(const)
+        self.code_ptr = int(self.R[0]) + const
         self.cycles += 2
     
 
-    def bar(self, dest, const : np.uint8) -> None:
+    def bar(self, dest : int, const : int) -> None:
         """
         Implements the bar instruction.
         Sets R[dest] = randint(0, 255) & const
         """
-        assert 0 <= dest < 255
-        self.R[dest] = np.uint16(random.randint(0, 255)) & np.uint16(const)
+        self.R[dest] = next(self._rand) & const
         self.cycles += 16
     
 
     def mpar(self, index : int) -> None:
         """
         Implements the mpar instruction.
-        Sets memory_ptr += R[dest].
+        Sets the memory pointer I += R[index].
         """
-        assert 0 <= index < 16
-        self.memory_ptr += self.R[index]
+        self.I += int(self.R[index])
         self.cycles += 1
 
     
@@ -287,11 +374,10 @@ class Chip16:
         Implements the spl instruction.
         Writes R[index] to address referenced by memory_ptr.
         """
-        assert 0 <= index < 16 and 0 <= self.I < len(self.ram)-1
-        hi, low = c16u.high_byte(self.R[index]),
-            c16u.low_byte(self.R[index])
-        self.ram[self.I] = hi
-        self.ram[self.I + 1] = lo
+        assert 0 <= self.I < len(self.ram) - 1
+        value = int(self.R[index])
+        self._ram_mv[self.I] = (value >> 8) & 0xFF
+        self._ram_mv[self.I + 1] = value & 0xFF
         self.cycles += 3
     
 
@@ -300,123 +386,336 @@ class Chip16:
         Implements the ldr instruction.
         Reads a 16 bit word from ram and writes this to R[dest].
         """
-        assert 0 <= index < 16 and 0 <= self.I < len(self.ram)-1
-        hi, lo = self.ram[self.I], self.ram[self.I + 1]
-        self.R[index] = np.uint16((hi << 8) | lo)
+        assert 0 <= self.I < len(self.ram) - 1
+        self.R[index] = int.from_bytes(self._ram_mv[self.I : self.I + 2], "big")
         self.cycles += 3
 
+    def dps(self, index : int) -> None:
+        """
+        Implements the dps instruction.
+        Sets the pointer of device index to R[0xE].
+        """
+        self.devices[index].set_ptr(self.R[0xE])
+
+
+    def dpg(self, index : int) -> None:
+        """
+        Implements the dpg instruction.
+        Sets R[0xE] to the pointer of device index.
+        """
+        self.R[0xE] = int(self.devices[index].get_ptr())
+
+
+    def rdb(self, index : int, nbytes : int) -> None:
+        """
+        Implements the rdb instruction.
+        Reads nbytes bytes from device index into memory starting at memory_ptr.
+        Like wrb, only the bytes that fit before the end of RAM are moved.
+        """
+        dest = self._ram_mv[self.I : self.I + nbytes]
+        dest[:] = self.devices[index].read(len(dest))
+        if any(self._covered[self.I : self.I + len(dest)]):
+            self._invalidate_blocks()
+
+
+    def wrb(self, index : int, nbytes : int) -> None:
+        """
+        Implements the wrb instruction.
+        Writes nbytes bytes starting at memory_ptr to device index.
+        """
+        self.devices[index].write(self._ram_mv[self.I : self.I + nbytes])
+
+
+    def _invalidate_blocks(self) -> None:
+        """
+        Throws away every compiled block, used when code in RAM changes.
+        """
+        self._blocks.clear()
+        self._covered[:] = bytes(len(self._covered))
+
+
+    def _compile_block(self, ram, start : int):
+        """
+        Compiles the straight line run of instructions at start into a
+        function of (R, I) returning the next code pointer and I.
+        Returns (function, instruction count, cycle count), or False if the
+        instruction at start can't be compiled.
+        """
+        lines = []
+        count = 0
+        cost = 0
+        pc = start
+        end = None
+        while end is None and count < BLOCK_LIMIT and pc + 1 < len(ram):
+            opcode = (ram[pc] << 8) | ram[pc + 1]
+            nib3 = opcode >> 12
+            x = (opcode >> 8) & 0xF
+            y = (opcode >> 4) & 0xF
+            nn = opcode & 0xFF
+            if nib3 == 8:
+                nib0 = opcode & 0xF
+                if nib0 not in ALU_SOURCE:
+                    break
+                if y == 0 and (nib0 == 0x6 or nib0 == 0xE):
+                    lines.append("R[15] = 0")
+                else:
+                    lines.append(ALU_SOURCE[nib0].format(x=x, y=y))
+                cost += 1
+            elif nib3 == 6:
+                lines.append("R[{}] = {}".format(x, nn))
+                cost += 1
+            elif nib3 == 7:
+                lines.append("R[{0}] = (R[{0}] + {1}) & 0xFFFF".format(x, nn))
+                cost += 1
+            elif nib3 in SKIP_SOURCE:
+                lines.append("if {}: return {}, I".format(
+                    SKIP_SOURCE[nib3].format(x=x, y=y, nn=nn), pc + 4
+                ))
+                end = "{}, I".format(pc + 2)
+                cost += 2
+            elif nib3 == 1:
+                end = "{}, I".format(opcode & 0xFFF)
+                cost += 1
+            elif nib3 == 0xA:
+                lines.append("I = {}".format(opcode & 0xFFF))
+                cost += 1
+            elif nib3 == 0xB:
+                end = "R[0] + {}, I".format(opcode & 0xFFF)
+                cost += 2
+            elif nib3 == 0xC:
+                lines.append("R[{}] = next(rand) & {}".format(x, nn))
+                cost += 16
+            else:
+                break
+            count += 1
+            pc += 2
+        if count == 0:
+            return False
+        lines.append("return " + (end or "{}, I".format(pc)))
+        source = "def block(R, I):\n" + "".join(
+            "    " + line + "\n" for line in lines
+        )
+        namespace = {"rand": self._rand}
+        exec(compile(source, "<block {:#05x}>".format(start), "exec"), namespace)
+        self._covered[start:pc] = b"\x01" * (pc - start)
+        return namespace["block"], count, cost
+
+
     def execute(self, num_of_ops=None) -> None:
         """
         The main decode/execute loop of the emulator.
         num_of_cycles gives the number of cycles the emulator will run for
         if nothing is specified the emulator will cycle until a hlt is reached.
+
+        The loop itself is the module level _run function.
         """
-        while num_of_ops > 0 or num_of_ops is None:
-            opcode = c16u.concat(
-                self.ram[self.code_ptr], self.ram[self.code_ptr + 1]
-            )
-            code_ptr_increment_flag = True
-            if nib0 == 0:
-                if opcode == 0x0000:
-                    # hlt opcode
-                    return
-                elif opcode == 0x01EE:
-                    self.ret()
-                    self.code_ptr += 2
+        if not _run(self, num_of_ops):
+            print("Program Execution took: {} cycles, {} real seconds.".format(self.cycles, real_time(self.cycles)))
 
-            elif nib3 == 1:
-                self.goto(np.uint16(opcode & 0xFFF))
-                code_ptr_increment_flag = False
-            elif nib3 == 2:
-                self.call(np.uint16(opcode & 0xFFF))
-                code_ptr_increment_flag = False
-            elif nib3 == 3:
-                self.snec(c16u.get_nibble(opcode, 2), c16u.low_byte(opcode))
-            elif nib3 == 4:
-                self.snuec(c16u.get_nibble(opcode, 2), c16u.low_byte(opcode))
-            elif nib3 == 5:
-                self.sne(c16u.get_nibble(opcode, 2), c16u.get_nibble(opcode, 1))
-            elif nib3 == 6:
-                self.acr(c16u.get_nibble(opcode, 2), c16u.get_nibble(opcode, 1))
-            elif nib3 == 7:
-                self.adc(c16u.get_nibble(opcode, 2), c16u.get_nibble(opcode, 1))
-            elif nib3 == 8:
-                nib0 = c16u.get_nibble(opcode, 0)
+
+def pypy_warmup(num_of_ops : int):
+    """
+    Under PyPy, runs WARMUP_CODE for num_of_ops instructions before the first
+    call so the JIT has traced the loop. Chunks of BLOCK_LIMIT keep it on the
+    inline interpreter rather than compiled blocks.
+    """
+    def decorator(run):
+        if platform.python_implementation() != "PyPy":
+            return run
+        warm = False
+
+        @functools.wraps(run)
+        def wrapper(chip, num):
+            nonlocal warm
+            if not warm:
+                warm = True
+                scratch = Chip16(WARMUP_CODE, devices=[], backend="pypy")
+                for _ in range(num_of_ops // BLOCK_LIMIT):
+                    run(scratch, BLOCK_LIMIT)
+            return run(chip, num)
+        return wrapper
+    return decorator
+
+
+@pypy_warmup(4000)
+def _run(chip : Chip16, num_of_ops) -> bool:
+    """
+    The loop behind Chip16.execute. Runs num_of_ops instructions, or until a
+    hlt if None, and returns True if a hlt was reached. Must be kept in step
+    with the instruction methods and Chip16._compile_block.
+    """
+    # Registers are worked on as a list of ints and written back at the end.
+    regs = chip.R
+    R = regs.tolist()
+    ram = chip._ram_mv
+    stack = chip.stack
+    devices = chip.devices
+    rand = chip._rand
+    # RAM changed since the last run may have overwritten compiled code.
+    if chip._blocks and bytes(chip.ram) != chip._ram_image:
+        chip._invalidate_blocks()
+    blocks = chip._blocks
+    covered = chip._covered
+    cp = chip.code_ptr
+    sp = chip.sp
+    I = chip.I
+    cycles = chip.cycles
+    # Negative when running until hlt, so it never counts down to zero.
+    remaining = -1 if num_of_ops is None else num_of_ops
+    try:
+        while remaining:
+            block = blocks.get(cp)
+            # Short runs such as single stepping aren't worth compiling.
+            if block is None and (remaining < 0 or remaining > BLOCK_LIMIT):
+                block = blocks[cp] = chip._compile_block(ram, cp)
+            if block and (remaining < 0 or remaining >= block[1]):
+                cp, I = block[0](R, I)
+                remaining -= block[1]
+                cycles += block[2]
+                continue
+            remaining -= 1
+            opcode = (ram[cp] << 8) | ram[cp + 1]
+            nib3 = opcode >> 12
+            x = (opcode >> 8) & 0xF
+            # Groups are tested roughly in order of how often they occur.
+            if nib3 == 8:
+                y = (opcode >> 4) & 0xF
+                nib0 = opcode & 0xF
                 if nib0 == 0:
-                    self.ar(
-                        c16u.get_nibble(opcode, 2), c16u.get_nibble(opcode, 1)
-                    )
+                    R[x] = R[y]
                 elif nib0 == 1:
-                    self.bit_or(
-                        c16u.get_nibble(opcode, 2), c16u.get_nibble(opcode, 1)
-                    )
+                    R[x] |= R[y]
                 elif nib0 == 2:
-                    self.bit_and(
-                        c16u.get_nibble(opcode, 2), c16u.get_nibble(opcode, 1)
-                    )
+                    R[x] &= R[y]
                 elif nib0 == 3:
-                    self.bit_xor(
-                        c16u.get_nibble(opcode, 2), c16u.get_nibble(opcode, 1)
-                    )
+                    R[x] ^= R[y]
                 elif nib0 == 4:
-                    self.add(
-                        c16u.get_nibble(opcode, 2), c16u.get_nibble(opcode, 1)
-                    )
+                    tmp = R[x] + R[y]
+                    R[0xF] = tmp >> 16
+                    R[x] = tmp & 0xFFFF
                 elif nib0 == 5:
-                    self.sub(
-                        c16u.get_nibble(opcode, 2), c16u.get_nibble(opcode, 1)
-                    )
+                    tmp = R[x] - R[y]
+                    R[0xF] = 1 if tmp >= 0 else 0
+                    R[x] = tmp & 0xFFFF
                 elif nib0 == 6:
-                    self.shr(
-                        c16u.get_nibble(opcode, 2), c16u.get_nibble(opcode, 1)
-                    )
+                    if y == 0:
+                        R[0xF] = 0
+                    else:
+                        R[0xF] = (R[x] >> (y - 1)) & 1
+                        R[x] >>= y
                 elif nib0 == 7:
-                    self.rsub(
-                        c16u.get_nibble(opcode, 2), c16u.get_nibble(opcode, 1)
-                    )
+                    tmp = R[y] - R[x]
+                    R[0xF] = 1 if tmp >= 0 else 0
+                    R[x] = tmp & 0xFFFF
                 elif nib0 == 0xE:
-                    self.shl(
-                        c16u.get_nibble(opcode, 2), c16u.get_nibble(opcode, 1)
-                    )
-
+                    if y == 0:
+                        R[0xF] = 0
+                    else:
+                        R[0xF] = (R[x] >> (16 - y)) & 1
+                        R[x] = (R[x] << y) & 0xFFFF
+                else:
+                    chip.alert = True
+                cycles += 1
+            elif nib3 == 6:
+                R[x] = opcode & 0xFF
+                cycles += 1
+            elif nib3 == 7:
+                R[x] = (R[x] + (opcode & 0xFF)) & 0xFFFF
+                cycles += 1
+            elif nib3 == 3:
+                if R[x] == opcode & 0xFF:
+                    cp += 2
+                cycles += 2
+            elif nib3 == 4:
+                if R[x] != opcode & 0xFF:
+                    cp += 2
+                cycles += 2
+            elif nib3 == 5:
+                if R[x] == R[(opcode >> 4) & 0xF]:
+                    cp += 2
+                cycles += 2
             elif nib3 == 9:
-                self.snue(
-                    c16u.get_nibble(opcode, 2), c16u.get_nibble(opcode, 1)
-                )
+                if R[x] != R[(opcode >> 4) & 0xF]:
+                    cp += 2
+                cycles += 2
+            elif nib3 == 1:
+                cp = opcode & 0xFFF
+                cycles += 1
+                continue
+            elif nib3 == 2:
+                if sp >= STACK_SIZE:
+                    raise c16e.StackOverflow()
+                stack[sp] = cp
+                sp += 1
+                cp = opcode & 0xFFF
+                cycles += 3
+                continue
+            elif nib3 == 0:
+                if opcode == 0x0000:
+                    # hlt opcode
+                    return True
+                elif opcode == 0x01EE:
+                    # Resume after the call instruction that pushed cp.
+                    if sp == 0:
+                        raise c16e.StackUnderflow()
+                    sp -= 1
+                    cp = int(stack[sp]) + 2
+                    cycles += 2
+                    continue
+                else:
+                    chip.alert = True
             elif nib3 == 0xA:
-                self.smp(np.uint16(opcode & 0xFFF))
+                I = opcode & 0xFFF
+                cycles += 1
             elif nib3 == 0xB:
-                self.cpac(np.uint16(opcode & 0xFFF))
-                code_ptr_increment_flag = False
+                cp = R[0] + (opcode & 0xFFF)
+                cycles += 2
+                continue
             elif nib3 == 0xC:
-                self.bar(c16u.get_nibble(opcode, 2), c16u.low_byte(opcode))
-            
+                R[x] = next(rand) & opcode & 0xFF
+                cycles += 16
+            elif nib3 == 0xD:
+                # rdb, cut off at the end of RAM like wrb.
+                dest = ram[I : I + (opcode & 0xFF)]
+                dest[:] = devices[x].read(len(dest))
+                if any(covered[I : I + len(dest)]):
+                    chip._invalidate_blocks()
             elif nib3 == 0xE:
-                lb = c16u.low_byte(opcode)
-                if lb == 0x0:
-                    self.devices[
-                        c16u.get_nibble(opcode, 2)
-                    ].set_ptr(self.R[0xE])
-                elif lb == 0x1:
-                    self.R[0xE] = self.devices[
-                        c16u.get_nibble(opcode, 2)
-                    ].get_ptr()
-                elif lb == 0x1E:
-                    self.mpar(c16u.get_nibble(opcode, 2))
-                elif lb == 0x55:
-                    self.spl(c16u.get_nibble(opcode, 2))
+                lb = opcode & 0xFF
+                if lb == 0x55:
+                    # spl
+                    ram[I] = R[x] >> 8
+                    ram[I + 1] = R[x] & 0xFF
+                    if covered[I] or covered[I + 1]:
+                        chip._invalidate_blocks()
+                    cycles += 3
                 elif lb == 0x65:
-                    self.ldr(c16u.get_nibble(opcode, 2))
+                    # ldr
+                    R[x] = (ram[I] << 8) | ram[I + 1]
+                    cycles += 3
+                elif lb == 0x1E:
+                    # mpar
+                    I += R[x]
+                    cycles += 1
+                elif lb == 0x00:
+                    # dps
+                    devices[x].set_ptr(R[0xE])
+                elif lb == 0x01:
+                    # dpg
+                    R[0xE] = int(devices[x].get_ptr())
+                else:
+                    chip.alert = True
             elif nib3 == 0xF:
-                self.devices[
-                    c16u.get_nibble(opcode, 2)
-                ].write(self.ram[self.I : self.I + c16u.low_byte(opcode)])
+                devices[x].write(ram[I : I + (opcode & 0xFF)])
             else:
-                self.alert = True
-            
-            if code_ptr_increment_flag:
-                self.code_ptr += 2
-            
-            if num_of_ops is not None:
-                num_of_ops -= 1
-        print("Program Execution took: {} cycles, {} real seconds.".format(self.cycles, real_time(self.cycles)))
+                chip.alert = True
+            cp += 2
+    finally:
+        chip.code_ptr = cp
+        chip.sp = sp
+        chip.I = I
+        chip.cycles = cycles
+        regs[:] = array("H", R)
+        if blocks:
+            chip._ram_image = bytes(chip.ram)
+    return False
@@ -2,28 +2,50 @@
 A module which implements the standard chip16 devices.
 """
 
-import numpy as np
+import sys
 
-class MemoryDevice:
+class BufferDevice:
     """
-    A memory extension device that allows the programmer to access 64k more memory.
+    A base for devices backed by a 64k buffer addressed through a 16 bit pointer.
     """
     def __init__(self):
-        self.ptr = np.uint16(0)
-        self.memory = [np.uint8(0) for _ in range(2**16)]
+        self.ptr = 0
+        self.memory = bytearray(2**16)
     
-    def read(self, nbytes : int) -> list:
-        return self.memory[self.ptr : self.ptr + nbytes]
+    def read(self, nbytes : int) -> bytearray:
+        end = self.ptr + nbytes
+        if end <= len(self.memory):
+            return self.memory[self.ptr : end]
+        # Reads wrap around the end of the 16 bit address space.
+        return self.memory[self.ptr :] + self.memory[: end - len(self.memory)]
     
     def write(self, bytes : list) -> None:
-        for i, byte in enumerate(bytes):
-            self.memory[self.ptr + i] = byte
+        ptr = self.ptr
+        excess = len(bytes) - len(self.memory)
+        if excess > 0:
+            # A write longer than the buffer laps it, and only its last 64k
+            # bytes survive.
+            ptr = (ptr + excess) & 0xFFFF
+            bytes = bytes[excess :]
+        end = ptr + len(bytes)
+        if end <= len(self.memory):
+            self.memory[ptr : end] = bytes
+        else:
+            # Writes wrap around the end of the 16 bit address space.
+            split = len(self.memory) - ptr
+            self.memory[ptr :] = bytes[: split]
+            self.memory[: end - len(self.memory)] = bytes[split :]
 
-    def get_ptr(self) -> np.uint16:
+    def get_ptr(self) -> int:
         return self.ptr
 
-    def set_ptr(self, ptr_value : np.uint16) -> None:
-        self.ptr = ptr_value
+    def set_ptr(self, ptr_value : int) -> None:
+        self.ptr = int(ptr_value) & 0xFFFF
+
+class MemoryDevice(BufferDevice):
+    """
+    A memory extension device that allows the programmer to access 64k more memory.
+    """
 
 class FloatingPointDevice:
     """
@@ -37,51 +59,35 @@ class ConsoleIO:
     A device that implements Console Input and Output.
     """
     def __init__(self):
-        self.format_code = np.uint16(0)
+        self.format_code = 0
     
-    def read(self, nbytes : int) -> list:
+    def read(self, nbytes : int) -> bytes:
         if self.format_code == 0:
-            return [np.uint8(ord(input())) for _ in range(nbytes)]
+            return bytes(ord(input()) for _ in range(nbytes))
         elif self.format_code == 1:
-            return [np.uint8(input()) for _ in range(nbytes)]
+            return bytes(int(input()) for _ in range(nbytes))
+        # Unknown format codes read as zero bytes.
+        return bytes(nbytes)
     
     def write(self, byte_list : list) -> None:
+        # Each write is a single call to stdout rather than one per byte.
         if self.format_code == 0:
-            for byte in byte_list:
-                print(chr(byte))
+            sys.stdout.write(bytes(byte_list).decode("latin-1"))
         elif self.format_code == 1:
-            print(hex(byte_list[0]))
-            for byte in byte_list[1:]:
-                print(hex(byte_list)[2:])
+            sys.stdout.write(" ".join("0x{:02x}".format(byte) for byte in bytes(byte_list)) + "\n")
     
-    def get_ptr(self) -> np.uint16:
+    def get_ptr(self) -> int:
         return self.format_code
     
-    def set_ptr(self, ptr : np.uint16) -> None:
-        self.format_code = ptr
+    def set_ptr(self, ptr : int) -> None:
+        self.format_code = int(ptr)
 
-class RomDevice:
+class RomDevice(BufferDevice):
     """
     A rom extension device that lets the programmer access roms left in rom.crm.
     """
     def __init__(self):
-        self.ptr = np.uint16(0)
-        self.memory = [np.uint8(0) for _ in range(2**16)]
-
+        super().__init__()
         with open('rom.crm', 'rb') as rom_file:
-            tmp = file.read()
-            for i in range(self.memory.size()):
-                self.memory[i] = np.uint8(tmp[i])
-    
-    def read(self, nbytes : int) -> list:
-        return self.memory[self.ptr : self.ptr + nbytes]
-    
-    def write(self, bytes : list) -> None:
-        for i, byte in enumerate(bytes):
-            self.memory[self.ptr + i] = byte
-        
-    def get_ptr(self) -> np.uint16:
-        return self.ptr
-    
-    def set_ptr(self, ptr_value : np.uint16) -> None:
-        self.ptr = ptr_value
\ No newline at end of file
+            tmp = rom_file.read(len(self.memory))
+            self.memory[:len(tmp)] = tmp
@@ -4,5 +4,11 @@ class SyntaxError(Exception):
 class OverflowError(Exception):
     pass
 
-class SizeError:
-    pass
\ No newline at end of file
+class SizeError(Exception):
+    pass
+
+class StackOverflow(Exception):
+    pass
+
+class StackUnderflow(Exception):
+    pass
@@ -4,6 +4,7 @@ main emulator directory.
 """
 
 import numpy as np
+import functools
 import sys
 
 def high_byte(value: np.uint16) -> np.uint16:
@@ -39,15 +40,25 @@ def to_hex(string : str) -> int:
     return int(string, 16)
 
 
-def is_hex(string: str) -> bool:
+@functools.lru_cache(maxsize=1024)
+def parse_hex(string: str):
     """
-    Checks if a string is hexadecimal, returns true if so and false otherwise.
+    Parses a hexadecimal string, returning its value or None if the string
+    isn't hexadecimal. The cache is for tools that parse the same operand
+    strings repeatedly, such as an assembler, and is bounded so that it
+    can't grow with every string it is given.
     """
     try:
-        int(string, 16)
-        return True
+        return int(string, 16)
     except ValueError:
-        return False
+        return None
+
+
+def is_hex(string: str) -> bool:
+    """
+    Checks if a string is hexadecimal, returns true if so and false otherwise.
+    """
+    return parse_hex(string) is not None
 
 
 def to_words(value : int) -> list:
@@ -0,0 +1,68 @@
+import chip16_device as c16d
+
+
+def test_memory_device_write_wraps():
+    """
+    Test that MemoryDevice.write() wraps around the end of the 64k buffer.
+    """
+    device = c16d.MemoryDevice()
+    device.set_ptr(0xFFFE)
+    device.write(b"\x01\x02\x03\x04")
+    assert device.memory[0xFFFE:] == b"\x01\x02"
+    assert device.memory[:2] == b"\x03\x04"
+
+
+def test_memory_device_read_wraps():
+    """
+    Test that MemoryDevice.read() wraps around the end of the 64k buffer.
+    """
+    device = c16d.MemoryDevice()
+    device.memory[0xFFFE:] = b"\x0A\x0B"
+    device.memory[:2] = b"\x0C\x0D"
+    device.set_ptr(0xFFFE)
+    assert device.read(4) == b"\x0A\x0B\x0C\x0D"
+    assert len(device.memory) == 2**16
+
+
+def test_memory_device_set_ptr_masks():
+    """
+    Test that MemoryDevice.set_ptr() keeps the pointer to 16 bits.
+    """
+    device = c16d.MemoryDevice()
+    device.set_ptr(0x1FFFE)
+    assert device.get_ptr() == 0xFFFE
+
+
+def test_console_io_write_characters(capsys):
+    """
+    Test that ConsoleIO.write() in format 0 prints the bytes as characters.
+    """
+    device = c16d.ConsoleIO()
+    device.write(memoryview(b"Hi!"))
+    assert capsys.readouterr().out == "Hi!"
+
+
+def test_console_io_write_hex(capsys):
+    """
+    Test that ConsoleIO.write() in format 1 prints the bytes as hex on one line.
+    """
+    device = c16d.ConsoleIO()
+    device.set_ptr(1)
+    device.write(memoryview(b"\x00\x0A\xFF"))
+    assert capsys.readouterr().out == "0x00 0x0a 0xff\n"
+
+
+def test_memory_device_write_longer_than_buffer():
+    """
+    Test that a MemoryDevice.write() longer than 64k keeps the buffer at 64k
+    and leaves each address holding the last byte written to it.
+    """
+    device = c16d.MemoryDevice()
+    device.set_ptr(0xFFFF)
+    data = bytes(i & 0xFF for i in range(70000))
+    device.write(data)
+    expected = bytearray(2**16)
+    for i, byte in enumerate(data):
+        expected[(0xFFFF + i) & 0xFFFF] = byte
+    assert len(device.memory) == 2**16
+    assert device.memory == expected
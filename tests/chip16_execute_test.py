@@ -0,0 +1,317 @@
+import chip16
+import chip16_device as c16d
+import chip16_except as c16e
+import pytest
+import random
+
+
+BACKENDS = ["numpy", "pypy"]
+
+
+def machine_state(c16):
+    """
+    Returns everything execute() can change about a Chip16 as plain values.
+    """
+    return (
+        [int(value) for value in c16.R],
+        bytes(c16.ram),
+        [int(value) for value in c16.stack[:c16.sp]],
+        c16.code_ptr,
+        c16.sp,
+        c16.I,
+        c16.cycles,
+        c16.alert,
+    )
+
+
+def random_program(rnd):
+    """
+    Builds a 64 instruction program from random opcodes, keeping jumps inside
+    the program and leaving out instructions that need devices or randomness.
+    """
+    code = []
+    for _ in range(64):
+        opcode = rnd.randrange(0x10000)
+        nib3 = opcode >> 12
+        if nib3 in (0xC, 0xD, 0xF):
+            opcode &= 0x0FFF
+        elif nib3 == 0xE:
+            opcode = 0xE000 | (opcode & 0xF00) | rnd.choice([0x55, 0x65, 0x1E])
+        elif nib3 in (0x1, 0x2):
+            opcode = (opcode & 0xF000) | rnd.randrange(0, 128, 2)
+        elif nib3 == 0xA:
+            opcode = 0xA000 | rnd.randrange(0, 120)
+        elif nib3 == 0xB:
+            opcode = 0xB000 | rnd.randrange(0, 64, 2)
+        code += [opcode >> 8, opcode & 0xFF]
+    return code
+
+
+def run_to_error(c16, steps):
+    """
+    Runs c16.execute(n) for each n in steps, stopping at the first exception,
+    and returns the name of that exception or None.
+    """
+    try:
+        for num_of_ops in steps:
+            c16.execute(num_of_ops)
+    except Exception as error:
+        return type(error).__name__
+    return None
+
+
+def test_chip16_execute_blocks_match_single_steps():
+    """
+    Tests that a long execute() run, which compiles blocks, leaves the machine
+    in the same state as running the same number of instructions one at a
+    time, which never compiles anything.
+    """
+    for backend in BACKENDS:
+        for seed in range(100):
+            code = random_program(random.Random(seed))
+            compiled = chip16.Chip16(code, devices=[], backend=backend)
+            stepped = chip16.Chip16(code, devices=[], backend=backend)
+            compiled_error = run_to_error(compiled, [400])
+            stepped_error = run_to_error(stepped, [1] * 400)
+            assert compiled_error == stepped_error
+            assert machine_state(compiled) == machine_state(stepped)
+
+
+def test_chip16_execute_spl_overwrites_block():
+    """
+    Tests that a spl over code in a compiled block makes the next run of that
+    code use the new instruction.
+    """
+    code = [
+        0x20, 0x10,  # call 0x10
+        0xA0, 0x10,  # smp 0x10
+        0x62, 0x63,  # acr R2, 0x63
+        0x82, 0x8E,  # shl R2, 8
+        0x72, 0x09,  # adc R2, 0x09
+        0xE2, 0x55,  # spl R2, patches 0x10 to acr R3, 9
+        0x20, 0x10,  # call 0x10
+        0x00, 0x00,  # hlt
+        0x63, 0x01,  # acr R3, 1
+        0x01, 0xEE,  # ret
+    ]
+    for backend in BACKENDS:
+        c16 = chip16.Chip16(code, devices=[], backend=backend)
+        c16.execute()
+        assert c16.R[3] == 9
+        assert bytes(c16.ram[0x10:0x12]) == bytes([0x63, 0x09])
+
+
+def test_chip16_execute_ram_written_between_calls():
+    """
+    Tests that RAM written from outside execute() is picked up by the next
+    call rather than running a stale compiled block.
+    """
+    for backend in BACKENDS:
+        c16 = chip16.Chip16([0x63, 0x01, 0x00, 0x00], devices=[], backend=backend)
+        c16.execute()
+        assert c16.R[3] == 1
+        c16.ram[1] = 0x09
+        c16.code_ptr = 0
+        c16.execute()
+        assert c16.R[3] == 9
+
+
+def test_chip16_execute_rdb():
+    """
+    Tests that an rdb opcode reads from a MemoryDevice into RAM, stopping at
+    the end of RAM.
+    """
+    for backend in BACKENDS:
+        device = c16d.MemoryDevice()
+        device.memory[:8] = b"\x11\x22\x33\x44\x55\x66\x77\x88"
+        code = [
+            0xA1, 0x00,  # smp 0x100
+            0xD0, 0x04,  # rdb 4 bytes from device 0
+            0xAF, 0xFE,  # smp 0xFFE
+            0xD0, 0x08,  # rdb 8 bytes from device 0, only 2 fit
+            0x00, 0x00,  # hlt
+        ]
+        c16 = chip16.Chip16(code, devices=[device], backend=backend)
+        c16.execute()
+        assert bytes(c16.ram[0x100:0x104]) == b"\x11\x22\x33\x44"
+        assert bytes(c16.ram[0xFFE:]) == b"\x11\x22"
+
+
+def test_chip16_execute_stack_overflow():
+    """
+    Tests that a call at depth STACK_SIZE raises StackOverflow and that the
+    machine state up to that point is still written back.
+    """
+    code = [
+        0x61, 0x05,  # acr R1, 5
+        0x20, 0x02,  # call 0x02, recursing until the stack is full
+    ]
+    for backend in BACKENDS:
+        c16 = chip16.Chip16(code, devices=[], backend=backend)
+        with pytest.raises(c16e.StackOverflow):
+            c16.execute()
+        assert c16.sp == chip16.STACK_SIZE
+        assert c16.code_ptr == 0x02
+        assert c16.R[1] == 5
+        assert c16.cycles == 1 + 3 * chip16.STACK_SIZE
+
+
+def test_chip16_execute_stack_underflow():
+    """
+    Tests that a ret on an empty stack raises StackUnderflow and that the
+    machine state up to that point is still written back.
+    """
+    code = [
+        0x61, 0x07,  # acr R1, 7
+        0x01, 0xEE,  # ret with nothing on the stack
+    ]
+    for backend in BACKENDS:
+        c16 = chip16.Chip16(code, devices=[], backend=backend)
+        with pytest.raises(c16e.StackUnderflow):
+            c16.execute()
+        assert c16.sp == 0
+        assert c16.code_ptr == 0x02
+        assert c16.R[1] == 7
+        assert c16.cycles == 1
+
+
+def test_chip16_execute_backends_agree():
+    """
+    Tests that the numpy and pypy backends end with the same registers, RAM
+    and cycle count on the same programs.
+    """
+    code = [
+        0x61, 0x07,  # acr R1, 7
+        0x62, 0x00,  # acr R2, 0
+        0x63, 0x0D,  # acr R3, 13
+        0x65, 0x01,  # acr R5, 1
+        0x82, 0x34,  # add R2, R3      <- 0x08
+        0x81, 0x55,  # sub R1, R5
+        0x41, 0x00,  # snuec R1, 0
+        0x10, 0x12,  # goto 0x12
+        0x10, 0x08,  # goto 0x08
+        0xA1, 0x00,  # smp 0x100       <- 0x12
+        0xE2, 0x55,  # spl R2
+        0xE4, 0x65,  # ldr R4
+        0x84, 0x26,  # shr R4, 2
+        0x00, 0x00,  # hlt
+    ]
+    for backend in BACKENDS:
+        c16 = chip16.Chip16(code, devices=[], backend=backend)
+        c16.execute()
+        assert c16.R[2] == 7 * 13
+        assert c16.R[4] == (7 * 13) >> 2
+        assert bytes(c16.ram[0x100:0x102]) == bytes([0x00, 7 * 13])
+    programs = [code] + [random_program(random.Random(seed)) for seed in range(50)]
+    for program in programs:
+        results = []
+        for backend in BACKENDS:
+            c16 = chip16.Chip16(program, devices=[], backend=backend)
+            error = run_to_error(c16, [400])
+            results.append((error, machine_state(c16)))
+        assert results[0] == results[1]
+
+
+# (name, opcode builder, method call, whether execute() then moves past the
+# instruction) for every instruction with a Chip16 method that needs no device.
+INSTRUCTIONS = [
+    ("ar", lambda x, y, nn: 0x8000 | x << 8 | y << 4, lambda c, x, y, nn: c.ar(x, y), True),
+    ("or", lambda x, y, nn: 0x8001 | x << 8 | y << 4, lambda c, x, y, nn: c.bit_or(x, y), True),
+    ("and", lambda x, y, nn: 0x8002 | x << 8 | y << 4, lambda c, x, y, nn: c.bit_and(x, y), True),
+    ("xor", lambda x, y, nn: 0x8003 | x << 8 | y << 4, lambda c, x, y, nn: c.bit_xor(x, y), True),
+    ("add", lambda x, y, nn: 0x8004 | x << 8 | y << 4, lambda c, x, y, nn: c.add(x, y), True),
+    ("sub", lambda x, y, nn: 0x8005 | x << 8 | y << 4, lambda c, x, y, nn: c.sub(x, y), True),
+    ("shr", lambda x, y, nn: 0x8006 | x << 8 | y << 4, lambda c, x, y, nn: c.shr(x, y), True),
+    ("rsub", lambda x, y, nn: 0x8007 | x << 8 | y << 4, lambda c, x, y, nn: c.rsub(x, y), True),
+    ("shl", lambda x, y, nn: 0x800E | x << 8 | y << 4, lambda c, x, y, nn: c.shl(x, y), True),
+    ("acr", lambda x, y, nn: 0x6000 | x << 8 | nn, lambda c, x, y, nn: c.acr(x, nn), True),
+    ("adc", lambda x, y, nn: 0x7000 | x << 8 | nn, lambda c, x, y, nn: c.adc(x, nn), True),
+    ("snec", lambda x, y, nn: 0x3000 | x << 8 | nn, lambda c, x, y, nn: c.snec(x, nn), True),
+    ("snuec", lambda x, y, nn: 0x4000 | x << 8 | nn, lambda c, x, y, nn: c.snuec(x, nn), True),
+    ("sne", lambda x, y, nn: 0x5000 | x << 8 | y << 4, lambda c, x, y, nn: c.sne(x, y), True),
+    ("snue", lambda x, y, nn: 0x9000 | x << 8 | y << 4, lambda c, x, y, nn: c.snue(x, y), True),
+    ("smp", lambda x, y, nn: 0xA000 | x << 8 | nn, lambda c, x, y, nn: c.smp(x << 8 | nn), True),
+    ("mpar", lambda x, y, nn: 0xE01E | x << 8, lambda c, x, y, nn: c.mpar(x), True),
+    ("spl", lambda x, y, nn: 0xE055 | x << 8, lambda c, x, y, nn: c.spl(x), True),
+    ("ldr", lambda x, y, nn: 0xE065 | x << 8, lambda c, x, y, nn: c.ldr(x), True),
+    ("goto", lambda x, y, nn: 0x1000 | x << 8 | nn, lambda c, x, y, nn: c.goto(x << 8 | nn), False),
+    ("call", lambda x, y, nn: 0x2000 | x << 8 | nn, lambda c, x, y, nn: c.call(x << 8 | nn), False),
+    ("cpac", lambda x, y, nn: 0xB000 | x << 8 | nn, lambda c, x, y, nn: c.cpac(x << 8 | nn), False),
+]
+
+
+def test_chip16_methods_match_execute():
+    """
+    Tests that each instruction method leaves the machine in the same state
+    as execute(1) running the matching opcode, from random register states.
+    """
+    rnd = random.Random(16)
+    for backend in BACKENDS:
+        for name, opcode_of, call_method, advances in INSTRUCTIONS:
+            for _ in range(200):
+                values = [rnd.choice([rnd.randrange(4), rnd.randrange(0x10000)]) for _ in range(16)]
+                x = rnd.randrange(16)
+                y = rnd.randrange(16)
+                nn = rnd.choice([values[x] & 0xFF, rnd.randrange(4), rnd.randrange(0x100)])
+                I = rnd.randrange(0x100, 0xFFE)
+                opcode = opcode_of(x, y, nn)
+                machines = []
+                for _ in range(2):
+                    c16 = chip16.Chip16([opcode >> 8, opcode & 0xFF], devices=[], backend=backend)
+                    for index, value in enumerate(values):
+                        c16.R[index] = value
+                    c16.I = I
+                    machines.append(c16)
+                executed, called = machines
+                executed.execute(1)
+                call_method(called, x, y, nn)
+                if advances:
+                    called.code_ptr += 2
+                assert machine_state(executed) == machine_state(called), (name, backend, values, x, y, nn)
+
+
+def test_chip16_execute_bar_seeded():
+    """
+    Tests that seeded machines give the same bar results through execute(),
+    including from compiled blocks, and again after reset().
+    """
+    code = [0xC1, 0xFF, 0xC2, 0xFF, 0x00, 0x00]
+    c16 = chip16.Chip16(code, devices=[], seed=7)
+    c16.execute()
+    first = (int(c16.R[1]), int(c16.R[2]))
+    other = chip16.Chip16(code, devices=[], seed=7)
+    other.execute()
+    assert (int(other.R[1]), int(other.R[2])) == first
+    c16.reset()
+    assert c16.seed == 7
+    c16.ram[:len(code)] = code
+    c16.execute()
+    assert (int(c16.R[1]), int(c16.R[2])) == first
+
+
+def test_chip16_pypy_warmup(monkeypatch):
+    """
+    Tests that under PyPy the pypy_warmup() wrapper runs the warmup program
+    once, in BLOCK_LIMIT sized chunks, and leaves real runs unchanged.
+    """
+    monkeypatch.setattr(chip16.platform, "python_implementation", lambda: "PyPy")
+    machines = []
+
+    def run(c16, num_of_ops):
+        machines.append(c16)
+        return chip16._run(c16, num_of_ops)
+
+    warm_run = chip16.pypy_warmup(10 * chip16.BLOCK_LIMIT)(run)
+    code = [0x61, 0x05, 0x71, 0x03, 0x00, 0x00]
+    c16 = chip16.Chip16(code, devices=[])
+    expected = chip16.Chip16(code, devices=[])
+    assert warm_run(c16, None) == chip16._run(expected, None)
+    assert machine_state(c16) == machine_state(expected)
+    scratch = machines[:-1]
+    assert len(scratch) == 10
+    assert all(machine is scratch[0] and machine is not c16 for machine in scratch)
+    assert scratch[0].cycles > 0
+    assert not scratch[0]._blocks
+
+    warm_run(c16, None)
+    assert len(machines) == 12
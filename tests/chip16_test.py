@@ -0,0 +1,140 @@
+import chip16
+import chip16_device as c16d
+import chip16_except as c16e
+import pytest
+
+
+BACKENDS = ["numpy", "pypy"]
+
+
+def test_chip16_rdb():
+    """
+    Tests the chip16.rdb() method reads bytes from a MemoryDevice into RAM at I.
+    """
+    for backend in BACKENDS:
+        device = c16d.MemoryDevice()
+        device.memory[0x100:0x104] = b"\x01\x02\x03\x04"
+        device.set_ptr(0x100)
+        c16 = chip16.Chip16([], devices=[device], backend=backend)
+        c16.I = 0x20
+        c16.rdb(0, 4)
+        assert bytes(c16.ram[0x20:0x24]) == b"\x01\x02\x03\x04"
+
+
+def test_chip16_rdb_end_of_ram():
+    """
+    Tests that chip16.rdb() stops at the end of RAM rather than raising.
+    """
+    for backend in BACKENDS:
+        device = c16d.MemoryDevice()
+        device.memory[:8] = b"\xAA" * 8
+        c16 = chip16.Chip16([], devices=[device], backend=backend)
+        c16.I = 0xFFE
+        c16.rdb(0, 8)
+        assert bytes(c16.ram[0xFFE:]) == b"\xAA\xAA"
+
+
+def test_chip16_ret_after_execute_call():
+    """
+    Tests that chip16.ret() resumes after a call run by execute(), the same
+    way the ret opcode does, instead of running the call again.
+    """
+    for backend in BACKENDS:
+        c16 = chip16.Chip16([0x20, 0x10], devices=[], backend=backend)
+        c16.execute(1)
+        assert c16.code_ptr == 0x10
+        c16.ret()
+        assert c16.code_ptr == 0x02
+        assert c16.sp == 0
+
+
+def test_chip16_call_stack_overflow():
+    """
+    Tests that chip16.call() raises StackOverflow once STACK_SIZE calls are nested.
+    """
+    c16 = chip16.Chip16([], devices=[])
+    for _ in range(chip16.STACK_SIZE):
+        c16.call(0x10)
+    with pytest.raises(c16e.StackOverflow):
+        c16.call(0x10)
+    assert c16.sp == chip16.STACK_SIZE
+
+
+def test_chip16_ret_stack_underflow():
+    """
+    Tests that chip16.ret() raises StackUnderflow on an empty stack.
+    """
+    c16 = chip16.Chip16([], devices=[])
+    with pytest.raises(c16e.StackUnderflow):
+        c16.ret()
+    assert c16.sp == 0
+
+
+def test_chip16_bar():
+    """
+    Tests that chip16.bar() masks its random byte and is reproducible from a seed.
+    """
+    for backend in BACKENDS:
+        results = []
+        for _ in range(2):
+            c16 = chip16.Chip16([], devices=[], backend=backend, seed=16)
+            values = []
+            for _ in range(32):
+                c16.bar(1, 0x0F)
+                values.append(int(c16.R[1]))
+            assert all(value <= 0x0F for value in values)
+            results.append(values)
+        assert results[0] == results[1]
+
+
+
+def test_chip16_snec():
+    """
+    Tests the chip16.snec() method skips only when R[index] == const.
+    """
+    c16 = chip16.Chip16([], devices=[])
+    c16.R[3] = 0x42
+    c16.snec(3, 0x42)
+    assert c16.code_ptr == 2
+    c16.snec(3, 0x43)
+    assert c16.code_ptr == 2
+
+
+def test_chip16_snuec():
+    """
+    Tests the chip16.snuec() method skips only when R[index] != const.
+    """
+    c16 = chip16.Chip16([], devices=[])
+    c16.R[3] = 0x42
+    c16.snuec(3, 0x43)
+    assert c16.code_ptr == 2
+    c16.snuec(3, 0x42)
+    assert c16.code_ptr == 2
+
+
+def test_chip16_smp():
+    """
+    Tests the chip16.smp() method sets the memory pointer I.
+    """
+    c16 = chip16.Chip16([], devices=[])
+    c16.smp(0xABC)
+    assert c16.I == 0xABC
+
+
+def test_chip16_mpar():
+    """
+    Tests the chip16.mpar() method adds R[index] to the memory pointer I.
+    """
+    c16 = chip16.Chip16([], devices=[])
+    c16.I = 0x100
+    c16.R[2] = 0x23
+    c16.mpar(2)
+    assert c16.I == 0x123
+
+
+def test_chip16_code_too_large():
+    """
+    Tests that a program larger than RAM raises SizeError.
+    """
+    with pytest.raises(c16e.SizeError):
+        chip16.Chip16([0] * 4097, devices=[])
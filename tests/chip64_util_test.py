@@ -41,6 +41,14 @@ def test_is_hex():
     assert c64u.is_hex("zf") == False
 
 
+def test_parse_hex():
+    """
+    Test the parse_hex() util function.
+    """
+    assert c64u.parse_hex("0xABCD") == 0xABCD
+    assert c64u.parse_hex("zf") is None
+
+
 def test_split():
     """
     Test the split() util function.